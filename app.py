@@ -1,54 +1,261 @@
-from flask import Flask, render_template, request, send_file, send_from_directory
+from flask import Flask, render_template, request, send_file, send_from_directory, url_for
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.dammit import EncodingDetector
+from cachetools import TTLCache
 import sqlite3
+import threading
+import queue
+import atexit
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
 from io import BytesIO
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 import os
+import re
+import hashlib
+import tempfile
 
 app = Flask(__name__)
 
 # ---------- Initialize Database ----------
+# One shared connection for the whole process; writes are serialized by DB_LOCK
+DB = sqlite3.connect("seo_data.db", check_same_thread=False, isolation_level=None)
+DB_LOCK = threading.Lock()
+
 def init_db():
-    conn = sqlite3.connect("seo_data.db")
-    c = conn.cursor()
+    c = DB.cursor()
+    # WAL + NORMAL sync: fewer fsyncs per commit, readers don't block writers
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute("PRAGMA synchronous=NORMAL")
+    c.execute("PRAGMA busy_timeout=5000")
+    c.execute("PRAGMA temp_store=MEMORY")
     c.execute('''CREATE TABLE IF NOT EXISTS seo_results
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
                   url TEXT,
                   seo_score INTEGER,
                   timestamp TEXT)''')
-    conn.commit()
-    conn.close()
+    # For "recent audits of a URL" and "top scores" lookups
+    c.execute("CREATE INDEX IF NOT EXISTS idx_results_url_ts ON seo_results(url, timestamp DESC)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_results_score ON seo_results(seo_score DESC, timestamp DESC)")
 
 init_db()
 
+def record_audits(rows):
+    """Insert (url, seo_score) rows in a single transaction."""
+    with DB_LOCK:
+        DB.execute("BEGIN")
+        try:
+            DB.executemany("INSERT INTO seo_results (url, seo_score, timestamp) VALUES (?, ?, datetime('now'))",
+                           rows)
+            DB.execute("COMMIT")
+        except Exception:
+            # A failed COMMIT can leave the transaction open on the shared connection
+            if DB.in_transaction:
+                DB.execute("ROLLBACK")
+            raise
+
+# ---------- Background Writer ----------
+# Requests enqueue rows and return; one thread commits them in batches
+WRITE_Q = queue.Queue()
+FLUSH_MAX_ROWS = 500
+FLUSH_WAIT = 0.2
+
+def _flusher():
+    while True:
+        rows = [WRITE_Q.get()]
+        deadline = time.monotonic() + FLUSH_WAIT
+        try:
+            while len(rows) < FLUSH_MAX_ROWS:
+                rows.append(WRITE_Q.get(timeout=max(0, deadline - time.monotonic())))
+        except queue.Empty:
+            pass
+        try:
+            record_audits(rows)
+        except Exception:
+            # Keep the writer alive; a dead thread would strand every later row
+            app.logger.exception("Failed to record %d audit rows", len(rows))
+        finally:
+            for _ in rows:
+                WRITE_Q.task_done()
+
+def _flush_on_exit():
+    rows = []
+    try:
+        while True:
+            rows.append(WRITE_Q.get_nowait())
+    except queue.Empty:
+        pass
+    try:
+        if rows:
+            record_audits(rows)
+    except Exception:
+        app.logger.exception("Failed to record %d audit rows at exit", len(rows))
+    finally:
+        for _ in rows:
+            WRITE_Q.task_done()
+    # Wait for any batch the writer thread had already taken
+    WRITE_Q.join()
+
+threading.Thread(target=_flusher, name="seo-db-writer", daemon=True).start()
+atexit.register(_flush_on_exit)
+
+# Only the first chunk of a page is parsed; SEO signals live in <head> and early <body>
+MAX_PAGE_BYTES = 512 * 1024
+
+# The audit only reads these tags, so skip building the rest of the tree
+AUDIT_STRAINER = SoupStrainer(["title", "meta", "h1", "img", "a", "script"])
+
+# Lookup attrs shared by the analyzer and the auto-fixer
+META_DESC_ATTRS = {"name": "description"}
+META_VP_ATTRS = {"name": "viewport"}
+LDJSON_ATTRS = {"type": "application/ld+json"}
+URL_SCHEMES = ("http://", "https://")
+# Only a comma that starts a new URL separates entries; commas inside a URL are kept
+URL_SPLIT_RE = re.compile(r",\s*(?=https?://)")
+
+# Platform markers, in priority order, matched in one case-insensitive pass
+PLATFORMS = (("wordpress", "WordPress"), ("shopify", "Shopify"),
+             ("wix", "Wix"), ("squarespace", "Squarespace"))
+PLATFORM_RE = re.compile("|".join(key for key, _ in PLATFORMS).encode(), re.I)
+
+# Private result keys carrying the fetched page through to the auto-fixer
+PAGE_KEYS = ("_html", "_charset")
+
+# Recent audits keyed by URL so resubmits skip the fetch and parse
+AUDIT_CACHE = TTLCache(maxsize=1024, ttl=300)
+AUDIT_CACHE_LOCK = threading.Lock()
+
+# ---------- HTTP Session ----------
+# Shared session so repeat audits reuse pooled keep-alive connections
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64,
+                       max_retries=Retry(total=2, backoff_factor=0.2))
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+# ---------- Audit Workers ----------
+# Fetch + parse runs on a pool so several URLs can be audited at once,
+# with a per-host cap so one site isn't hit by every worker. Audits over
+# the cap wait in a per-host queue, not on a pool thread.
+EXEC = ThreadPoolExecutor(max_workers=32)
+MAX_PER_HOST = 4
+MAX_URLS_PER_REQUEST = 10
+_HOST_ACTIVE = {}   # host -> audits running on the pool
+_HOST_PENDING = {}  # host -> deque of (url, future) waiting for a slot
+_HOST_LOCK = threading.Lock()
+
+def _start_audit(host, url, future):
+    EXEC.submit(analyze_website, url).add_done_callback(
+        lambda done: _finish_audit(host, done, future))
+
+def _finish_audit(host, done, future):
+    exc = done.exception()
+    if exc is not None:
+        future.set_exception(exc)
+    else:
+        future.set_result(done.result())
+
+    with _HOST_LOCK:
+        pending = _HOST_PENDING.get(host)
+        if pending:
+            nxt = pending.popleft()
+            if not pending:
+                del _HOST_PENDING[host]
+        else:
+            # Idle hosts are dropped so the tables only hold hosts in flight
+            nxt = None
+            _HOST_ACTIVE[host] -= 1
+            if not _HOST_ACTIVE[host]:
+                del _HOST_ACTIVE[host]
+    if nxt is not None:
+        _start_audit(host, *nxt)
+
+def submit_audit(url):
+    """Schedule an audit of url and return a Future for its result."""
+    host = urlsplit(url).hostname or ""
+    future = Future()
+    with _HOST_LOCK:
+        active = _HOST_ACTIVE.get(host, 0)
+        if active >= MAX_PER_HOST:
+            _HOST_PENDING.setdefault(host, deque()).append((url, future))
+            return future
+        _HOST_ACTIVE[host] = active + 1
+    _start_audit(host, url, future)
+    return future
+
+def audit_many(urls):
+    """Audit URLs concurrently and return results in input order."""
+    futures = {submit_audit(url): i for i, url in enumerate(urls)}
+    results = [None] * len(urls)
+    for future in as_completed(futures):
+        results[futures[future]] = future.result()
+    return results
+
 # ---------- SEO Analyzer ----------
 def analyze_website(url):
+    with AUDIT_CACHE_LOCK:
+        cached = AUDIT_CACHE.get(url)
+    if cached is not None:
+        # Callers add per-request keys, so hand out a copy
+        return dict(cached)
+
+    result = _analyze_website(url)
+    if "error" not in result:
+        with AUDIT_CACHE_LOCK:
+            # Page HTML is only needed by the current request; don't pin it in memory
+            AUDIT_CACHE[url] = {k: v for k, v in result.items() if k not in PAGE_KEYS}
+    return result
+
+def _fetch_page(url, max_bytes=MAX_PAGE_BYTES):
+    """GET url, reading at most max_bytes (None = all); returns (final_url, response, raw_bytes)."""
+    # Fake browser headers (avoid blocking)
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                      "AppleWebKit/537.36 (KHTML, like Gecko) "
+                      "Chrome/120.0.0.0 Safari/537.36"
+    }
+
     try:
-        # Fake browser headers (avoid blocking)
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                          "AppleWebKit/537.36 (KHTML, like Gecko) "
-                          "Chrome/120.0.0.0 Safari/537.36"
-        }
+        response = SESSION.get(url, headers=headers, timeout=10, stream=True)
+    except requests.exceptions.SSLError:
+        if url.startswith("https://"):
+            url = url.replace("https://", "http://")
+            response = SESSION.get(url, headers=headers, timeout=10, stream=True)
+        else:
+            raise
+    except requests.exceptions.ConnectionError:
+        raise Exception("Failed to connect to the website. It may be offline or blocking requests.")
+
+    with response:
+        raw = response.raw.read(max_bytes, decode_content=True)
+    return url, response, raw
+
+def _page_encoding(response, raw):
+    """Encoding from the Content-Type header, else the page's <meta charset>, else UTF-8."""
+    # requests assumes ISO-8859-1 for bare text/*, so only trust an explicit header charset.
+    # Always returning a name keeps bs4 from falling back to chardet detection.
+    content_type = response.headers.get("Content-Type", "").lower()
+    if "charset" in content_type:
+        return response.encoding
+    return EncodingDetector.find_declared_encoding(raw, is_html=True) or "utf-8"
+
+def _analyze_website(url):
+    try:
+        url, response, raw = _fetch_page(url)
 
-        try:
-            response = requests.get(url, headers=headers, timeout=10)
-        except requests.exceptions.SSLError:
-            if url.startswith("https://"):
-                url = url.replace("https://", "http://")
-                response = requests.get(url, headers=headers, timeout=10)
-            else:
-                raise
-        except requests.exceptions.ConnectionError:
-            raise Exception("Failed to connect to the website. It may be offline or blocking requests.")
-
-        soup = BeautifulSoup(response.text, "html.parser")
+        charset = _page_encoding(response, raw)
+
+        soup = BeautifulSoup(raw, "lxml", parse_only=AUDIT_STRAINER, from_encoding=charset)
 
         # --- Extract key elements ---
         title = soup.title.string.strip() if soup.title and soup.title.string else "No title found"
-        meta = soup.find("meta", attrs={"name": "description"})
+        meta = soup.find("meta", attrs=META_DESC_ATTRS)
         meta_desc = meta["content"].strip() if meta and meta.get("content") else "No meta description found"
 
         h1_tags = soup.find_all("h1")
@@ -80,36 +287,27 @@ def analyze_website(url):
             score -= 10
             issues.append("Not enough internal/external links")
             fixes.append("Add more internal/external links to enhance navigation.")
-        if len(response.text) < 500:
+        if len(raw) < 500:
             score -= 10
             issues.append("Page content too short")
             fixes.append("Add more keyword-rich and valuable content.")
 
         # --- Mobile-friendly check ---
-        viewport = soup.find("meta", attrs={"name": "viewport"})
+        viewport = soup.find("meta", attrs=META_VP_ATTRS)
         if not viewport:
             score -= 10
             issues.append("Not mobile-friendly")
             fixes.append("Add a responsive viewport meta tag for mobile support.")
 
         # --- Schema markup check ---
-        if not soup.find("script", attrs={"type": "application/ld+json"}):
+        if not soup.find("script", attrs=LDJSON_ATTRS):
             score -= 10
             issues.append("No structured data found")
             fixes.append("Add JSON-LD structured data from schema.org.")
 
         # --- Platform detection ---
-        html = response.text.lower()
-        if "wordpress" in html:
-            platform = "WordPress"
-        elif "shopify" in html:
-            platform = "Shopify"
-        elif "wix" in html:
-            platform = "Wix"
-        elif "squarespace" in html:
-            platform = "Squarespace"
-        else:
-            platform = "Custom/Static site"
+        found = {m.lower().decode() for m in PLATFORM_RE.findall(raw)}
+        platform = next((name for key, name in PLATFORMS if key in found), "Custom/Static site")
 
         score = max(0, min(100, score))
 
@@ -124,16 +322,18 @@ def analyze_website(url):
             "seo_score": score,
             "report": issues,
             "fixes": fixes,
-            "platform": platform
+            "platform": platform,
+            "_html": raw,
+            "_charset": charset
         }
 
     except Exception as e:
         return {"error": str(e)}
 
 # ---------- Generate Fixed HTML ----------
-def generate_fixed_page(url, html_content):
+def generate_fixed_page(url, html_content, charset=None):
     os.makedirs("fixed_sites", exist_ok=True)
-    soup = BeautifulSoup(html_content, "html.parser")
+    soup = BeautifulSoup(html_content, "lxml", from_encoding=charset)
 
     # Auto-fix common SEO issues
     if not soup.title:
@@ -141,15 +341,15 @@ def generate_fixed_page(url, html_content):
         new_title.string = "AI Optimized Page"
         soup.head.insert(0, new_title)
 
-    if not soup.find("meta", attrs={"name": "description"}):
+    if not soup.find("meta", attrs=META_DESC_ATTRS):
         meta = soup.new_tag("meta", attrs={"name": "description", "content": "AI optimized meta description."})
         soup.head.append(meta)
 
-    if not soup.find("meta", attrs={"name": "viewport"}):
+    if not soup.find("meta", attrs=META_VP_ATTRS):
         viewport = soup.new_tag("meta", attrs={"name": "viewport", "content": "width=device-width, initial-scale=1.0"})
         soup.head.append(viewport)
 
-    if not soup.find("script", attrs={"type": "application/ld+json"}):
+    if not soup.find("script", attrs=LDJSON_ATTRS):
         schema = soup.new_tag("script", attrs={"type": "application/ld+json"})
         schema.string = """{
             "@context": "https://schema.org",
@@ -168,45 +368,85 @@ def generate_fixed_page(url, html_content):
         h1.string = "AI Generated Heading for SEO Improvement"
         soup.body.insert(0, h1)
 
-    file_path = os.path.join("fixed_sites", "corrected_page.html")
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(str(soup))
+    # One file per URL so concurrent fixes don't overwrite each other
+    filename = hashlib.blake2b(url.encode(), digest_size=8).hexdigest() + ".html"
+    file_path = os.path.join("fixed_sites", filename)
+
+    # Write to a temp file and rename so readers never see a partial page
+    fd, tmp_path = tempfile.mkstemp(dir="fixed_sites", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            fd = None  # now owned by f
+            f.write(soup.encode(formatter="minimal"))
+        # mkstemp creates 0600; keep the page readable by a front-end web server
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if fd is not None:
+            os.close(fd)
+        os.unlink(tmp_path)
+        raise
     return file_path
 
 # ---------- Routes ----------
 @app.route("/", methods=["GET", "POST"])
 def home():
     result = None
+    extra_results = []
     if request.method == "POST":
-        url = request.form.get("website_url", "").strip()
+        urls = [u.strip() for u in URL_SPLIT_RE.split(request.form.get("website_url", "")) if u.strip()]
         ownership = request.form.get("ownership", "no")
 
-        if not url.startswith(("http://", "https://")):
+        if not urls or not all(u.startswith(URL_SCHEMES) for u in urls):
             result = {"error": "Please enter a valid URL starting with http or https."}
+        elif len(urls) > MAX_URLS_PER_REQUEST:
+            result = {"error": f"Please enter at most {MAX_URLS_PER_REQUEST} URLs at a time."}
         else:
-            result = analyze_website(url)
+            results = audit_many(urls)
+            for u, r in zip(urls, results):
+                if "error" not in r:
+                    WRITE_Q.put((u, r["seo_score"]))
+
+            # The first URL gets the full report; any others are summarized
+            url, result = urls[0], results[0]
+            extra_results = list(zip(urls[1:], results[1:]))
+            html, charset = result.pop("_html", None), result.pop("_charset", None)
+            for r in results[1:]:
+                for key in PAGE_KEYS:
+                    r.pop(key, None)
             if "error" not in result:
-                conn = sqlite3.connect("seo_data.db")
-                c = conn.cursor()
-                c.execute("INSERT INTO seo_results (url, seo_score, timestamp) VALUES (?, ?, datetime('now'))",
-                          (url, result["seo_score"]))
-                conn.commit()
-                conn.close()
-
                 if ownership.lower() == "yes":
-                    headers = {"User-Agent": "Mozilla/5.0"}
-                    response = requests.get(url, headers=headers, timeout=10)
-                    path = generate_fixed_page(url, response.text)
-                    result["fixed_path"] = path
-                    result["ownership_message"] = "✅ You own this site. AI auto-fix applied."
+                    try:
+                        if html is None or len(html) >= MAX_PAGE_BYTES:
+                            # Cached audits don't carry the page, and a capped read may have cut it
+                            # short; the fixed copy needs the whole page
+                            _, response, html = _fetch_page(url, max_bytes=None)
+                            charset = _page_encoding(response, html)
+                    except Exception as e:
+                        result["ownership_message"] = f"⚠️ Could not refetch the page for auto-fix: {e}"
+                    else:
+                        path = generate_fixed_page(url, html, charset)
+                        result["fixed_path"] = path
+                        # Versioned link: a re-fix gets a new URL, so the served file can be cached as immutable
+                        result["fixed_url"] = url_for("serve_fixed_files", filename=os.path.basename(path),
+                                                      v=os.stat(path).st_mtime_ns)
+                        result["ownership_message"] = "✅ You own this site. AI auto-fix applied."
                 else:
                     result["ownership_message"] = "⚠️ You don’t own this site. Only suggestions shown."
 
-    return render_template("index.html", result=result)
+    return render_template("index.html", result=result, extra_results=extra_results)
 
 @app.route("/fixed_sites/<path:filename>")
 def serve_fixed_files(filename):
-    return send_from_directory("fixed_sites", filename)
+    if not request.args.get("v"):
+        # Unversioned links can go stale when the page is re-fixed; let the client revalidate
+        return send_from_directory("fixed_sites", filename)
+    resp = send_from_directory("fixed_sites", filename, conditional=True, max_age=3600)
+    resp.headers["Cache-Control"] = "public, max-age=3600, immutable"
+    return resp
+
+# Form fields that never belong in the PDF report
+PDF_SKIP_KEYS = frozenset({"csrf_token"})
 
 @app.route("/download", methods=["POST"])
 def download_pdf():
@@ -218,11 +458,14 @@ def download_pdf():
     pdf.drawString(220, 750, "Smart SEO Auditor Report")
     pdf.line(50, 740, 550, 740)
 
-    y = 710
+    # One text object for all fields instead of a drawString per line
+    text = pdf.beginText(70, 710)
+    text.setLeading(20)
     for key, value in data.items():
-        if key not in ['csrf_token']:
-            pdf.drawString(70, y, f"{key.capitalize()}: {value}")
-            y -= 20
+        if key in PDF_SKIP_KEYS:
+            continue
+        text.textLine(f"{key.capitalize()}: {value}")
+    pdf.drawText(text)
 
     pdf.save()
     buffer.seek(0)